@@ -1,10 +1,17 @@
 import os
 import logging
 from telegram import Update
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
 import random
 from collections import defaultdict
 import json
+import io
+import struct
+import hashlib
+import itertools
+import re
+from functools import lru_cache
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,11 +28,14 @@ except KeyError:
     exit(1)
 
 # Состояния для ConversationHandler
-INPUT_CLASSES, INPUT_SUBJECTS, INPUT_DIFFICULT_SUBJECTS = range(3)
+INPUT_CLASSES, INPUT_SUBJECTS, INPUT_DIFFICULT_SUBJECTS, INPUT_SNAPSHOT = range(4)
 
 # Дни недели
 DAYS_OF_WEEK = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница"]
 MAX_LESSONS_PER_DAY = 7  # Максимальное количество уроков в день
+MAX_WEEKLY_HOURS = MAX_LESSONS_PER_DAY * len(DAYS_OF_WEEK)  # Максимум часов в неделю для класса
+MAX_CLASSES = 100  # Максимальное количество классов в расписании
+MAX_SUBJECTS_PER_CLASS = 50  # Максимальное количество предметов у класса
 
 # Категории сложности
 DIFFICULTY_LEVELS = {
@@ -35,9 +45,189 @@ DIFFICULTY_LEVELS = {
     "легкий": 0
 }
 
+# Стандартный профиль сложности, доступный всем пользователям
+STANDARD_PROFILE_NAME = "стандартный"
+STANDARD_PROFILE = {
+    "математика": 3,
+    "алгебра": 3,
+    "геометрия": 3,
+    "физика": 3,
+    "химия": 2,
+    "информатика": 2,
+    "история": 1,
+    "биология": 1,
+    "география": 1,
+    "труд": 0,
+    "музыка": 0,
+    "изо": 0,
+    "физкультура": 0
+}
+
+# Формат бинарного снимка расписания
+SNAPSHOT_MAGIC = b'OSBS'
+SNAPSHOT_VERSION = 1
+# Заголовок: сигнатура, версия, строк, настроек сложности, классов, сеток
+SNAPSHOT_HEADER = struct.Struct('<4sBHHHH')
+
 # Глобальное хранилище данных (временно, без БД)
 schedule_data = {}
 
+# Ограничения профилей сложности
+MAX_PROFILE_SUBJECTS = 100
+MAX_SUBJECT_NAME_LENGTH = 64
+MAX_PROFILE_NAME_LENGTH = 32
+MAX_CHAT_PROFILE_NAMES = 50
+PROFILES_PAGE_SIZE = 20
+# Длины id профиля: более длинный берется только при совпадении короткого
+PROFILE_ID_LENGTHS = (10, 16, 64)
+
+# Реестр профилей сложности: id -> настройки.
+# Пользователи и чаты хранят только id, одинаковые настройки хранятся один раз.
+# Реестр живет в памяти: если user_data и chat_data начнут сохраняться
+# между перезапусками, реестр нужно сохранять вместе с ними
+difficulty_profiles = {}
+# Количество ссылок на профиль (пользователи, чаты, названия)
+profile_refs = {}
+# Порядковый номер регистрации профиля, входит в ключ кэша сопоставлений
+profile_serials = {}
+_next_profile_serial = itertools.count()
+# Общедоступные названия профилей: название -> id.
+# Названия, сохраненные пользователями, хранятся в chat_data их чата
+public_profile_names = {}
+
+def normalize_profile(difficulty_settings):
+    """
+    Проверяет настройки сложности и приводит названия предметов к нижнему регистру
+    """
+    if not isinstance(difficulty_settings, dict) or not difficulty_settings:
+        raise ValueError("profile must be a non-empty dict")
+    if len(difficulty_settings) > MAX_PROFILE_SUBJECTS:
+        raise ValueError(f"profile has more than {MAX_PROFILE_SUBJECTS} subjects")
+
+    normalized = {}
+    for subject, level in difficulty_settings.items():
+        if not isinstance(subject, str):
+            raise ValueError("subject name must be a string")
+        subject = subject.strip().lower()
+        if not subject or len(subject) > MAX_SUBJECT_NAME_LENGTH:
+            raise ValueError(f"bad subject name {subject!r}")
+        if isinstance(level, bool) or level not in DIFFICULTY_LEVELS.values():
+            raise ValueError(f"bad difficulty level {level!r} for {subject!r}")
+        normalized[subject] = level
+    return normalized
+
+def register_profile(difficulty_settings):
+    """
+    Регистрирует профиль сложности и возвращает его id (хеш содержимого).
+    Профиль без ссылок удаляется, поэтому id сразу сохраняется через set_profile
+    """
+    settings = normalize_profile(difficulty_settings)
+    # Порядок важен: при поиске побеждает первый подходящий предмет
+    canonical = json.dumps(list(settings.items()), ensure_ascii=False)
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    for length in PROFILE_ID_LENGTHS:
+        profile_id = digest[:length]
+        stored = difficulty_profiles.get(profile_id)
+        if stored is None:
+            difficulty_profiles[profile_id] = settings
+            profile_refs[profile_id] = 0
+            profile_serials[profile_id] = next(_next_profile_serial)
+            return profile_id
+        if list(stored.items()) == list(settings.items()):
+            return profile_id
+
+    raise ValueError("profile id collision")
+
+def acquire_profile(profile_id):
+    profile_refs[profile_id] += 1
+
+def release_profile(profile_id):
+    if profile_id not in profile_refs:
+        return
+    profile_refs[profile_id] -= 1
+    # Профиль, на который никто не ссылается, удаляется из реестра
+    if profile_refs[profile_id] <= 0:
+        del difficulty_profiles[profile_id]
+        del profile_refs[profile_id]
+        del profile_serials[profile_id]
+
+def set_profile(data, profile_id):
+    """
+    Записывает id профиля в user_data или chat_data (None — убрать профиль)
+    и обновляет счетчики ссылок
+    """
+    old_id = data.get('difficulty_profile')
+    if old_id == profile_id:
+        return
+    if profile_id is None:
+        data.pop('difficulty_profile', None)
+    else:
+        acquire_profile(profile_id)
+        data['difficulty_profile'] = profile_id
+    if old_id is not None:
+        release_profile(old_id)
+
+def get_chat_profile_names(context):
+    if context.chat_data is None:
+        return {}
+    return context.chat_data.get('profile_names', {})
+
+# Поиск профиля по id или названию (сначала названия чата, затем общие)
+def resolve_profile(reference, context):
+    reference = reference.strip().lower()
+    if reference in difficulty_profiles:
+        return reference
+    for names in (get_chat_profile_names(context), public_profile_names):
+        profile_id = names.get(reference)
+        if profile_id in difficulty_profiles:
+            return profile_id
+    return None
+
+def get_profile_name(profile_id, context):
+    for names in (get_chat_profile_names(context), public_profile_names):
+        for name, named_id in names.items():
+            if named_id == profile_id:
+                return name
+    return None
+
+# Профиль пользователя, а если его нет или он устарел — профиль чата (школы)
+def get_profile_id(context):
+    profile_id = context.user_data.get('difficulty_profile')
+    if profile_id in difficulty_profiles:
+        return profile_id
+    if context.chat_data is not None:
+        profile_id = context.chat_data.get('difficulty_profile')
+        if profile_id in difficulty_profiles:
+            return profile_id
+    return None
+
+def get_difficulty_settings(context):
+    profile_id = get_profile_id(context)
+    if profile_id is None:
+        return None
+    return difficulty_profiles[profile_id]
+
+# Общий ограниченный кэш сопоставлений для всех профилей
+@lru_cache(maxsize=4096)
+def _match_subject(profile_id, serial, subject_name):
+    # Ищем предмет в настройках сложности (регистронезависимо)
+    for key, level in difficulty_profiles[profile_id].items():
+        if key in subject_name:
+            return level
+    return 0  # По умолчанию легкий
+
+def get_subject_difficulty(profile_id, subject_name):
+    """
+    Определяет сложность предмета по профилю
+    """
+    return _match_subject(profile_id, profile_serials[profile_id], subject_name.lower())
+
+# Стандартный профиль закреплен общим названием и не удаляется
+_standard_profile_id = register_profile(STANDARD_PROFILE)
+public_profile_names[STANDARD_PROFILE_NAME] = _standard_profile_id
+acquire_profile(_standard_profile_id)
+
 # Обработчик команды /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(
@@ -49,7 +239,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         '/view_schedule - посмотреть текущее расписание\n'
         '/view_timetable - посмотреть расписание по дням недели\n'
         '/clear_schedule - очистить расписание\n'
-        '/show_difficult - показать текущие настройки сложности'
+        '/export - выгрузить снимок расписания\n'
+        '/import - загрузить снимок расписания\n'
+        '/show_difficult - показать текущие настройки сложности\n'
+        '/profiles - список профилей сложности\n'
+        '/use_profile - выбрать профиль сложности'
     )
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -74,6 +268,7 @@ async def set_difficult(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         "музыка: легкий\n"
         "история: средний\n\n"
         "Каждый предмет с новой строки.\n"
+        "Готовый профиль можно выбрать одной командой: /use_profile стандартный\n"
         "Для отмены введите /cancel"
     )
     return INPUT_DIFFICULT_SUBJECTS
@@ -94,6 +289,16 @@ async def input_difficult_subjects(update: Update, context: ContextTypes.DEFAULT
             subject = subject.strip().lower()
             difficulty = difficulty.strip().lower()
             
+            if not subject:
+                await update.message.reply_text(f"❌ Не указано название предмета в строке '{line}'.")
+                return INPUT_DIFFICULT_SUBJECTS
+            if len(subject) > MAX_SUBJECT_NAME_LENGTH:
+                await update.message.reply_text(
+                    f"❌ Название предмета '{subject[:MAX_SUBJECT_NAME_LENGTH]}…' длиннее "
+                    f"{MAX_SUBJECT_NAME_LENGTH} символов."
+                )
+                return INPUT_DIFFICULT_SUBJECTS
+            
             if difficulty in DIFFICULTY_LEVELS:
                 difficulty_settings[subject] = DIFFICULTY_LEVELS[difficulty]
             else:
@@ -107,8 +312,18 @@ async def input_difficult_subjects(update: Update, context: ContextTypes.DEFAULT
         await update.message.reply_text("❌ Не указаны предметы. Попробуйте снова.")
         return INPUT_DIFFICULT_SUBJECTS
     
-    # Сохраняем настройки сложности
-    context.user_data['difficulty_settings'] = difficulty_settings
+    if len(difficulty_settings) > MAX_PROFILE_SUBJECTS:
+        await update.message.reply_text(f"❌ Слишком много предметов: не более {MAX_PROFILE_SUBJECTS}.")
+        return INPUT_DIFFICULT_SUBJECTS
+    
+    # Сохраняем настройки сложности в реестре, пользователю — только id
+    try:
+        profile_id = register_profile(difficulty_settings)
+    except ValueError as e:
+        logger.warning(f'Profile registration failed: {e}')
+        await update.message.reply_text("❌ Не удалось сохранить настройки сложности. Попробуйте снова.")
+        return INPUT_DIFFICULT_SUBJECTS
+    set_profile(context.user_data, profile_id)
     
     # Создаем обратный словарь для удобства
     difficulty_to_subjects = defaultdict(list)
@@ -125,6 +340,8 @@ async def input_difficult_subjects(update: Update, context: ContextTypes.DEFAULT
             for subj in subjects_in_level:
                 response += f"  • {subj}\n"
     
+    response += f"\n🔑 Id профиля: {profile_id}\n"
+    response += "Чтобы дать профилю название, используйте /save_profile <название>\n"
     response += "\nТеперь вы можете создать расписание с учетом этих настроек."
     
     await update.message.reply_text(response)
@@ -132,20 +349,22 @@ async def input_difficult_subjects(update: Update, context: ContextTypes.DEFAULT
 
 # Команда для просмотра текущих настроек сложности
 async def show_difficult(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if 'difficulty_settings' not in context.user_data or not context.user_data['difficulty_settings']:
+    difficulty_settings = get_difficulty_settings(context)
+    if not difficulty_settings:
         await update.message.reply_text(
             "📭 Настройки сложности не заданы.\n"
-            "Используйте /set_difficult для настройки."
+            "Используйте /set_difficult или /use_profile для настройки."
         )
         return
     
-    difficulty_settings = context.user_data['difficulty_settings']
+    profile_id = get_profile_id(context)
     difficulty_to_subjects = defaultdict(list)
     
     for subject, level in difficulty_settings.items():
         difficulty_to_subjects[level].append(subject)
     
-    response = "📊 Текущие настройки сложности предметов:\n\n"
+    response = "📊 Текущие настройки сложности предметов:\n"
+    response += f"🔑 Профиль: {get_profile_name(profile_id, context) or profile_id}\n\n"
     
     for level_name, level_value in sorted(DIFFICULTY_LEVELS.items(), key=lambda x: x[1], reverse=True):
         subjects_in_level = difficulty_to_subjects.get(level_value, [])
@@ -163,13 +382,158 @@ async def show_difficult(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     await update.message.reply_text(response)
 
+# Список доступных профилей сложности (общие и сохраненные в этом чате)
+async def list_profiles(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    entries = [(name, profile_id, "🌐") for name, profile_id in sorted(public_profile_names.items())]
+    entries += [(name, profile_id, "🏫") for name, profile_id in sorted(get_chat_profile_names(context).items())]
+    entries = [entry for entry in entries if entry[1] in difficulty_profiles]
+
+    total_pages = max(1, -(-len(entries) // PROFILES_PAGE_SIZE))
+    try:
+        page = int(context.args[0]) if context.args else 1
+    except ValueError:
+        page = 1
+    page = min(max(page, 1), total_pages)
+
+    response = f"📚 Профили сложности (страница {page} из {total_pages}):\n\n"
+    for name, profile_id, mark in entries[(page - 1) * PROFILES_PAGE_SIZE:page * PROFILES_PAGE_SIZE]:
+        response += f"{mark} {name} ({profile_id}): {len(difficulty_profiles[profile_id])} предметов\n"
+    if not entries:
+        response += "Нет сохраненных профилей.\n"
+    if page < total_pages:
+        response += f"\nСледующая страница: /profiles {page + 1}\n"
+
+    current_id = get_profile_id(context)
+    if current_id is not None:
+        response += f"\n🔑 Ваш профиль: {get_profile_name(current_id, context) or current_id}\n"
+
+    response += "\n🌐 — общий профиль, 🏫 — профиль этого чата\n"
+    response += "Выбрать профиль: /use_profile <название или id>\n"
+    response += "Профиль для всего чата (школы): /chat_profile <название или id>"
+
+    await update.message.reply_text(response)
+
+# Выбор профиля сложности одной командой
+async def use_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not context.args:
+        await update.message.reply_text(
+            "Укажите название или id профиля, например:\n"
+            f"/use_profile {STANDARD_PROFILE_NAME}\n\n"
+            "Список профилей: /profiles"
+        )
+        return
+
+    profile_id = resolve_profile(' '.join(context.args), context)
+    if profile_id is None:
+        await update.message.reply_text("❌ Профиль не найден. Список профилей: /profiles")
+        return
+
+    set_profile(context.user_data, profile_id)
+    await update.message.reply_text(
+        f"✅ Выбран профиль {get_profile_name(profile_id, context) or profile_id}.\n"
+        "Используйте /show_difficult для просмотра настроек."
+    )
+
+# В группах профили школы настраивают только администраторы
+async def is_chat_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    chat = update.effective_chat
+    if chat.type == 'private':
+        return True
+    member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
+    return member.status in ('administrator', 'creator')
+
+# Профиль сложности для всех пользователей чата (школы)
+async def chat_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await is_chat_admin(update, context):
+        await update.message.reply_text("❌ Профиль чата могут менять только администраторы.")
+        return
+
+    if not context.args:
+        await update.message.reply_text(
+            "Укажите название или id профиля для этого чата, например:\n"
+            f"/chat_profile {STANDARD_PROFILE_NAME}"
+        )
+        return
+
+    profile_id = resolve_profile(' '.join(context.args), context)
+    if profile_id is None:
+        await update.message.reply_text("❌ Профиль не найден. Список профилей: /profiles")
+        return
+
+    set_profile(context.chat_data, profile_id)
+    await update.message.reply_text(
+        f"✅ Профиль {get_profile_name(profile_id, context) or profile_id} установлен для этого чата.\n"
+        "Он используется всеми, кто не выбрал собственный профиль."
+    )
+
+# Сохранение текущих настроек сложности под названием в этом чате
+async def save_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await is_chat_admin(update, context):
+        await update.message.reply_text("❌ Сохранять профили в чате могут только администраторы.")
+        return
+
+    profile_id = get_profile_id(context)
+    if profile_id is None:
+        await update.message.reply_text("📭 Настройки сложности не заданы.\nИспользуйте /set_difficult для настройки.")
+        return
+
+    if not context.args:
+        await update.message.reply_text("Укажите название профиля, например:\n/save_profile моя школа")
+        return
+
+    name = ' '.join(context.args).strip().lower()
+    if len(name) > MAX_PROFILE_NAME_LENGTH:
+        await update.message.reply_text(f"❌ Название должно быть не длиннее {MAX_PROFILE_NAME_LENGTH} символов.")
+        return
+    # Название, похожее на id, перекрыло бы поиск по id
+    if re.fullmatch(r'[0-9a-f]{%d,}' % PROFILE_ID_LENGTHS[0], name):
+        await update.message.reply_text("❌ Название не может совпадать по виду с id профиля.")
+        return
+
+    names = context.chat_data.setdefault('profile_names', {})
+    taken_id = names.get(name, public_profile_names.get(name))
+    if taken_id is not None and taken_id != profile_id:
+        await update.message.reply_text(f"❌ Название '{name}' уже занято другим профилем.")
+        return
+    if taken_id is None:
+        if len(names) >= MAX_CHAT_PROFILE_NAMES:
+            await update.message.reply_text(f"❌ В этом чате уже сохранено {MAX_CHAT_PROFILE_NAMES} профилей.")
+            return
+        acquire_profile(profile_id)
+        names[name] = profile_id
+
+    await update.message.reply_text(
+        f"✅ Профиль сохранен как '{name}'.\n"
+        f"Участники этого чата могут выбрать его командой /use_profile {name}"
+    )
+
+# Удаление названия профиля из этого чата
+async def remove_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await is_chat_admin(update, context):
+        await update.message.reply_text("❌ Удалять профили в чате могут только администраторы.")
+        return
+
+    if not context.args:
+        await update.message.reply_text("Укажите название профиля, например:\n/remove_profile моя школа")
+        return
+
+    name = ' '.join(context.args).strip().lower()
+    names = context.chat_data.get('profile_names', {})
+    if name not in names:
+        await update.message.reply_text(f"❌ В этом чате нет профиля '{name}'. Список профилей: /profiles")
+        return
+
+    # Профиль удаляется из реестра, если на него больше никто не ссылается
+    release_profile(names.pop(name))
+    await update.message.reply_text(f"✅ Профиль '{name}' удален из этого чата.")
+
 # Начало создания расписания
 async def new_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     # Проверяем, заданы ли настройки сложности
-    if 'difficulty_settings' not in context.user_data:
+    if get_difficulty_settings(context) is None:
         await update.message.reply_text(
             "⚠️ Сначала задайте настройки сложности предметов!\n"
-            "Используйте /set_difficult\n\n"
+            "Используйте /set_difficult или /use_profile стандартный\n\n"
             "Хотите продолжить без настроек сложности? (да/нет)"
         )
         context.user_data['waiting_for_difficulty_confirmation'] = True
@@ -223,6 +587,10 @@ async def input_classes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await update.message.reply_text("❌ Не указаны классы. Попробуйте снова.")
         return INPUT_CLASSES
     
+    if len(classes) > MAX_CLASSES:
+        await update.message.reply_text(f"❌ Слишком много классов: не более {MAX_CLASSES}. Попробуйте снова.")
+        return INPUT_CLASSES
+    
     # Сохраняем классы
     context.user_data['classes'] = classes
     context.user_data['current_class_index'] = 0
@@ -252,6 +620,8 @@ async def input_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     current_index = context.user_data['current_class_index']
     current_class = classes[current_index]
     
+    profile_id = get_profile_id(context)
+
     # Разбираем предметы
     subjects_input = [line.strip() for line in user_text.split('\n') if line.strip()]
     subjects_data = []
@@ -266,13 +636,8 @@ async def input_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 if subject_name:
                     # Определяем сложность предмета
                     difficulty = 0  # По умолчанию легкий
-                    if 'difficulty_settings' in context.user_data:
-                        difficulty_settings = context.user_data['difficulty_settings']
-                        # Ищем предмет в настройках сложности (регистронезависимо)
-                        for key in difficulty_settings:
-                            if key.lower() in subject_name.lower():
-                                difficulty = difficulty_settings[key]
-                                break
+                    if profile_id is not None:
+                        difficulty = get_subject_difficulty(profile_id, subject_name)
                     
                     subjects_data.append({
                         'name': subject_name,
@@ -290,12 +655,16 @@ async def input_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("❌ Не указаны предметы или неправильный формат. Попробуйте снова.")
         return INPUT_SUBJECTS
     
+    if len(subjects_data) > MAX_SUBJECTS_PER_CLASS:
+        await update.message.reply_text(f"❌ Слишком много предметов: не более {MAX_SUBJECTS_PER_CLASS}. Попробуйте снова.")
+        return INPUT_SUBJECTS
+    
     # Проверяем, не слишком ли много часов
     total_hours = sum(subj['hours_per_week'] for subj in subjects_data)
-    if total_hours > MAX_LESSONS_PER_DAY * 5:
+    if total_hours > MAX_WEEKLY_HOURS:
         await update.message.reply_text(
             f"⚠️ Внимание! Слишком много часов в неделю для класса {current_class}.\n"
-            f"Всего: {total_hours} часов при максимуме {MAX_LESSONS_PER_DAY * 5}\n"
+            f"Всего: {total_hours} часов при максимуме {MAX_WEEKLY_HOURS}\n"
             f"Продолжить? (да/нет)"
         )
         context.user_data['pending_subjects'] = subjects_data
@@ -328,9 +697,9 @@ async def input_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
 
 # Улучшенная функция генерации расписания с учетом сложности
-def generate_daily_timetable_with_difficulty(subjects, class_name):
+def build_daily_timetable_with_difficulty(subjects):
     """
-    Генерирует расписание с учетом сложности предметов
+    Распределяет уроки по дням недели с учетом сложности предметов
     """
     # Создаем список уроков с информацией о сложности
     lessons_list = []
@@ -372,8 +741,12 @@ def generate_daily_timetable_with_difficulty(subjects, class_name):
         difficulty = lesson['difficulty']
         day = DAYS_OF_WEEK[day_index]
         
-        # Получаем доступные позиции для этого уровня сложности в этот день
-        available_positions = day_positions[day].get(difficulty, [])
+        # Получаем доступные позиции для этого уровня сложности в этот день,
+        # позиции разных уровней пересекаются, поэтому занятые пропускаем
+        occupied_positions = [l['position'] for l in daily_timetable[day]]
+        available_positions = [
+            p for p in day_positions[day].get(difficulty, []) if p not in occupied_positions
+        ]
         
         if available_positions:
             # Выбираем первую доступную позицию
@@ -391,28 +764,26 @@ def generate_daily_timetable_with_difficulty(subjects, class_name):
             # Обновляем day_positions
             day_positions[day][difficulty] = available_positions
         else:
-            # Если нет доступных позиций для этой сложности, ставим в любую свободную
+            # Если нет доступных позиций для этой сложности, ставим в любую свободную,
+            # а если день заполнен — в первый день со свободной позицией
             all_positions = list(range(1, MAX_LESSONS_PER_DAY + 1))
-            occupied_positions = [l['position'] for l in daily_timetable[day]]
-            free_positions = [p for p in all_positions if p not in occupied_positions]
-            
-            if free_positions:
-                position = free_positions[0]
-                daily_timetable[day].append({
-                    'name': lesson['name'],
-                    'position': position,
-                    'difficulty': difficulty
-                })
-            else:
-                # Если все позиции заняты, переходим к следующему дню
-                day_index = (day_index + 1) % len(DAYS_OF_WEEK)
+            for _ in range(len(DAYS_OF_WEEK)):
                 day = DAYS_OF_WEEK[day_index]
-                position = 1
-                daily_timetable[day].append({
-                    'name': lesson['name'],
-                    'position': position,
-                    'difficulty': difficulty
-                })
+                occupied_positions = [l['position'] for l in daily_timetable[day]]
+                free_positions = [p for p in all_positions if p not in occupied_positions]
+                if free_positions:
+                    break
+                day_index = (day_index + 1) % len(DAYS_OF_WEEK)
+            else:
+                # Вся неделя заполнена — урок не помещается
+                logger.warning(f"No free slot for lesson {lesson['name']}")
+                continue
+            
+            daily_timetable[day].append({
+                'name': lesson['name'],
+                'position': free_positions[0],
+                'difficulty': difficulty
+            })
         
         # Переходим к следующему дню для следующего урока
         day_index = (day_index + 1) % len(DAYS_OF_WEEK)
@@ -420,10 +791,36 @@ def generate_daily_timetable_with_difficulty(subjects, class_name):
     # Сортируем уроки в каждом дне по позиции
     for day in DAYS_OF_WEEK:
         daily_timetable[day].sort(key=lambda x: x['position'])
-    
-    # Форматируем результат
+
+    return daily_timetable
+
+# Распределение уроков без учета сложности (случайный порядок)
+def build_daily_timetable_random(subjects):
+    lessons_list = []
+    for subject in subjects:
+        for _ in range(subject['hours_per_week']):
+            lessons_list.append(subject['name'])
+
+    random.shuffle(lessons_list)
+    daily_timetable = {day: [] for day in DAYS_OF_WEEK}
+    day_index = 0
+    for lesson in lessons_list:
+        current_day = DAYS_OF_WEEK[day_index]
+        daily_timetable[current_day].append({
+            'name': lesson,
+            'position': len(daily_timetable[current_day]) + 1,
+            'difficulty': 0
+        })
+        day_index = (day_index + 1) % len(DAYS_OF_WEEK)
+
+    return daily_timetable
+
+def format_daily_timetable_with_difficulty(daily_timetable, subjects, class_name):
+    """
+    Форматирует расписание класса с учетом сложности предметов
+    """
     result = f"📅 Расписание для класса {class_name}:\n\n"
-    
+
     for day in DAYS_OF_WEEK:
         lessons = daily_timetable[day]
         if lessons:
@@ -463,9 +860,127 @@ def generate_daily_timetable_with_difficulty(subjects, class_name):
     result += f"• Сложных уроков в неделю: {total_difficult}\n"
     result += f"• Легких уроков в неделю: {total_easy}\n"
     result += f"• Баланс сложности: {'⚖️ Хороший' if total_difficult <= total_easy else '⚠️ Много сложных'}\n"
-    
+
+    return result
+
+def format_daily_timetable_random(daily_timetable, class_name):
+    timetable_text = f"📅 Расписание для класса {class_name} (без учета сложности):\n\n"
+    for day in DAYS_OF_WEEK:
+        lessons = daily_timetable[day]
+        if lessons:
+            timetable_text += f"<b>{day}:</b>\n"
+            for lesson in lessons:
+                timetable_text += f"  {lesson['position']}. {lesson['name']}\n"
+            timetable_text += f"  Всего уроков: {len(lessons)}\n"
+        else:
+            timetable_text += f"<b>{day}:</b> Нет уроков\n"
+        timetable_text += "\n"
+    return timetable_text
+
+# Уроки каждого дня идут подряд с первой позиции, как в случайном расписании
+def grid_is_compact(daily_timetable):
+    for day in DAYS_OF_WEEK:
+        positions = sorted(lesson['position'] for lesson in daily_timetable.get(day, []))
+        if positions != list(range(1, len(positions) + 1)):
+            return False
+    return True
+
+# Совпадает ли сетка уроков с количеством часов по предметам
+def grid_matches_subjects(daily_timetable, subjects):
+    lesson_counts = defaultdict(int)
+    for day in DAYS_OF_WEEK:
+        for lesson in daily_timetable.get(day, []):
+            lesson_counts[lesson['name']] += 1
+
+    subject_counts = defaultdict(int)
+    for subject in subjects:
+        if subject['hours_per_week'] > 0:
+            subject_counts[subject['name']] += subject['hours_per_week']
+
+    return lesson_counts == subject_counts
+
+def diff_timetables(old_timetable, new_timetable, compare_difficulty=True):
+    """
+    Сравнивает две сетки уроков класса по дням.
+    Возвращает для каждого измененного дня добавленные, удаленные,
+    перемещенные внутри дня уроки и предметы с изменившейся сложностью
+    """
+    diff = {}
+    for day in DAYS_OF_WEEK:
+        old_positions = defaultdict(list)
+        for lesson in old_timetable.get(day, []):
+            old_positions[lesson['name']].append(lesson['position'])
+        new_positions = defaultdict(list)
+        for lesson in new_timetable.get(day, []):
+            new_positions[lesson['name']].append(lesson['position'])
+
+        # Сложность задается для предмета целиком
+        difficulty_changed = []
+        if compare_difficulty:
+            old_levels = {lesson['name']: lesson['difficulty'] for lesson in old_timetable.get(day, [])}
+            for lesson in new_timetable.get(day, []):
+                old_level = old_levels.get(lesson['name'])
+                change = (lesson['name'], old_level, lesson['difficulty'])
+                if old_level is not None and old_level != lesson['difficulty'] and change not in difficulty_changed:
+                    difficulty_changed.append(change)
+
+        added, removed, moved = [], [], []
+        for name in list(old_positions) + [n for n in new_positions if n not in old_positions]:
+            old_left = [p for p in old_positions.get(name, []) if p not in new_positions.get(name, [])]
+            new_left = [p for p in new_positions.get(name, []) if p not in old_positions.get(name, [])]
+
+            # Один и тот же предмет на другой позиции считаем перемещением
+            for old_pos, new_pos in zip(old_left, new_left):
+                moved.append((name, old_pos, new_pos))
+            for new_pos in new_left[len(old_left):]:
+                added.append((name, new_pos))
+            for old_pos in old_left[len(new_left):]:
+                removed.append((name, old_pos))
+
+        if added or removed or moved or difficulty_changed:
+            diff[day] = {'added': added, 'removed': removed, 'moved': moved, 'difficulty': difficulty_changed}
+
+    return diff
+
+def get_difficulty_emoji(difficulty):
+    if difficulty >= 3:
+        return "🔴"  # Очень сложный
+    elif difficulty == 2:
+        return "🟠"  # Сложный
+    elif difficulty == 1:
+        return "🟡"  # Средний
+    return "🟢"  # Легкий
+
+def format_timetable_diff(diff, class_name):
+    result = f"🔄 Изменения в расписании класса {class_name}:\n\n"
+    for day in DAYS_OF_WEEK:
+        if day not in diff:
+            continue
+        result += f"<b>{day}:</b>\n"
+        for name, position in sorted(diff[day]['added'], key=lambda x: x[1]):
+            result += f"  ➕ {position}. {name}\n"
+        for name, position in sorted(diff[day]['removed'], key=lambda x: x[1]):
+            result += f"  ➖ {position}. {name}\n"
+        for name, old_pos, new_pos in sorted(diff[day]['moved'], key=lambda x: x[2]):
+            result += f"  🔀 {name}: {old_pos} → {new_pos}\n"
+        for name, old_level, new_level in diff[day]['difficulty']:
+            result += f"  🎯 {name}: {get_difficulty_emoji(old_level)} → {get_difficulty_emoji(new_level)}\n"
+        result += "\n"
     return result
 
+# Отправка текста с разбивкой на части, возвращает id отправленных сообщений
+async def send_timetable_text(update: Update, text):
+    if len(text) > 4000:
+        parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
+    else:
+        parts = [text]
+
+    message_ids = []
+    for part in parts:
+        message = await update.message.reply_text(part, parse_mode='HTML')
+        message_ids.append(message.message_id)
+    return message_ids
+
 # Обновленная функция просмотра расписания
 async def view_timetable(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if 'schedule' not in context.user_data or not context.user_data['schedule']:
@@ -476,75 +991,179 @@ async def view_timetable(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     classes = context.user_data.get('classes', list(schedule.keys()))
     
     # Проверяем, есть ли настройки сложности
-    has_difficulty = 'difficulty_settings' in context.user_data
-    
-    if has_difficulty:
-        info_text = "📊 Расписание с учетом сложности предметов:\n"
-        info_text += "🔴 - очень сложный\n"
-        info_text += "🟠 - сложный\n"
-        info_text += "🟡 - средний\n"
-        info_text += "🟢 - легкий\n"
-        await update.message.reply_text(info_text)
-    
-    # Отправляем расписание для каждого класса
+    has_difficulty = get_difficulty_settings(context) is not None
+
+    # /view_timetable full — отправить все классы заново,
+    # /view_timetable new — перемешать расписание без учета сложности заново
+    args = [arg.lower() for arg in (context.args or [])]
+    send_full = 'full' in args
+    regenerate = 'new' in args
+
+    # Последняя доставленная сетка и сообщения по каждому классу
+    previous_timetable = context.user_data.get('timetable', {})
+    delivered = context.user_data.setdefault('timetable_messages', {})
+    chat_id = update.message.chat_id
+
+    # Генерируем расписание и определяем, что изменилось
+    planned = []
     for cls in classes:
         if cls in schedule:
             subjects = schedule[cls]
-            
+            previous = previous_timetable.get(cls)
+
             if has_difficulty:
-                timetable_text = generate_daily_timetable_with_difficulty(subjects, cls)
+                daily_timetable = build_daily_timetable_with_difficulty(subjects)
+                timetable_text = format_daily_timetable_with_difficulty(daily_timetable, subjects, cls)
             else:
-                # Без учета сложности используем старый алгоритм
-                lessons_list = []
-                for subject in subjects:
-                    for _ in range(subject['hours_per_week']):
-                        lessons_list.append(subject['name'])
-                
-                random.shuffle(lessons_list)
-                daily_timetable = {day: [] for day in DAYS_OF_WEEK}
-                day_index = 0
-                for lesson in lessons_list:
-                    current_day = DAYS_OF_WEEK[day_index]
-                    daily_timetable[current_day].append(lesson)
-                    day_index = (day_index + 1) % len(DAYS_OF_WEEK)
-                
-                timetable_text = f"📅 Расписание для класса {cls} (без учета сложности):\n\n"
-                for day in DAYS_OF_WEEK:
-                    lessons = daily_timetable[day]
-                    if lessons:
-                        timetable_text += f"<b>{day}:</b>\n"
-                        for i, lesson in enumerate(lessons, 1):
-                            timetable_text += f"  {i}. {lesson}\n"
-                        timetable_text += f"  Всего уроков: {len(lessons)}\n"
-                    else:
-                        timetable_text += f"<b>{day}:</b> Нет уроков\n"
-                    timetable_text += "\n"
-            
-            # Отправляем сообщение с разбивкой если нужно
-            if len(timetable_text) > 4000:
-                parts = [timetable_text[i:i+4000] for i in range(0, len(timetable_text), 4000)]
-                for part in parts:
-                    await update.message.reply_text(part, parse_mode='HTML')
+                # Без учета сложности используем старый алгоритм,
+                # но не перемешиваем заново, если предметы не менялись
+                if (not regenerate and previous is not None
+                        and grid_is_compact(previous) and grid_matches_subjects(previous, subjects)):
+                    daily_timetable = previous
+                else:
+                    daily_timetable = build_daily_timetable_random(subjects)
+                timetable_text = format_daily_timetable_random(daily_timetable, cls)
+
+            text_hash = hashlib.sha1(timetable_text.encode('utf-8')).hexdigest()
+            record = delivered.get(cls)
+            if record is not None and record['chat_id'] != chat_id:
+                record = None
+
+            if send_full or record is None or previous is None:
+                status = 'full'
+            elif record['text_hash'] == text_hash:
+                status = 'unchanged'
+            elif record.get('has_difficulty') != has_difficulty:
+                # Сменился формат расписания — список изменений его не передаст
+                status = 'reformatted'
             else:
-                await update.message.reply_text(timetable_text, parse_mode='HTML')
-    
+                status = 'changed'
+            planned.append((cls, daily_timetable, timetable_text, text_hash, previous, record, status))
+
+    # Легенда отправляется перед первым новым сообщением с расписанием,
+    # исправленные на месте сообщения уже находятся под прежней легендой
+    legend_pending = has_difficulty
+
+    async def send_legend():
+        nonlocal legend_pending
+        if legend_pending:
+            legend_pending = False
+            info_text = "📊 Расписание с учетом сложности предметов:\n"
+            info_text += "🔴 - очень сложный\n"
+            info_text += "🟠 - сложный\n"
+            info_text += "🟡 - средний\n"
+            info_text += "🟢 - легкий\n"
+            await update.message.reply_text(info_text)
+
+    # Сгенерированная сетка сохраняется для экспорта снимка и сравнения
+    context.user_data['timetable'] = {}
+    for cls in list(delivered):
+        if cls not in schedule:
+            del delivered[cls]
+
+    sent_classes, edited_classes, diff_classes, unchanged_classes = [], [], [], []
+    # Классы, отложенные из-за ограничения частоты запросов Telegram
+    postponed_classes = []
+
+    # Отправляем только изменившиеся классы
+    for cls, daily_timetable, timetable_text, text_hash, previous, record, status in planned:
+        context.user_data['timetable'][cls] = daily_timetable
+
+        if status == 'unchanged':
+            unchanged_classes.append(cls)
+            continue
+
+        if postponed_classes:
+            # После ограничения частоты не отправляем ничего нового, прежняя
+            # сетка остается последней доставленной
+            if previous is not None:
+                context.user_data['timetable'][cls] = previous
+            else:
+                del context.user_data['timetable'][cls]
+            postponed_classes.append(cls)
+            continue
+
+        if status in ('changed', 'reformatted'):
+            # Редактируем прежнее сообщение на месте, если это возможно
+            if len(record['message_ids']) == 1 and len(timetable_text) <= 4000:
+                try:
+                    await context.bot.edit_message_text(
+                        timetable_text,
+                        chat_id=chat_id,
+                        message_id=record['message_ids'][0],
+                        parse_mode='HTML'
+                    )
+                    record['text_hash'] = text_hash
+                    record['has_difficulty'] = has_difficulty
+                    edited_classes.append(cls)
+                    continue
+                except RetryAfter as e:
+                    # Не заменяем правку новыми сообщениями: откладываем класс до следующего запроса
+                    logger.warning(f'Rate limited while editing timetable for {cls}, retry after {e.retry_after}s')
+                    context.user_data['timetable'][cls] = previous
+                    postponed_classes.append(cls)
+                    continue
+                except TelegramError as e:
+                    logger.warning(f'Could not edit timetable message for {cls}: {e}')
+
+        if status == 'changed':
+            # Иначе отправляем компактный список изменений
+            diff = diff_timetables(previous, daily_timetable, compare_difficulty=has_difficulty)
+            diff_text = format_timetable_diff(diff, cls)
+            if diff and len(diff_text) < len(timetable_text):
+                await send_legend()
+                await update.message.reply_text(diff_text, parse_mode='HTML')
+                # Прежние сообщения устарели, редактировать больше нечего
+                delivered[cls] = {
+                    'chat_id': chat_id, 'message_ids': [], 'text_hash': text_hash, 'has_difficulty': has_difficulty
+                }
+                diff_classes.append(cls)
+                continue
+
+        await send_legend()
+        message_ids = await send_timetable_text(update, timetable_text)
+        delivered[cls] = {
+            'chat_id': chat_id, 'message_ids': message_ids, 'text_hash': text_hash, 'has_difficulty': has_difficulty
+        }
+        sent_classes.append(cls)
+
     # Финальное сообщение
     total_classes = len(classes)
     if has_difficulty:
-        await update.message.reply_text(
+        final_text = (
             f"✅ Расписание для {total_classes} классов с учетом сложности сгенерировано!\n"
             f"Для изменения настроек сложности используйте /set_difficult"
         )
     else:
-        await update.message.reply_text(
+        final_text = (
             f"📊 Расписание для {total_classes} классов\n"
             f"⚠️ Для учета сложности предметов используйте /set_difficult"
         )
 
+    if edited_classes or diff_classes or unchanged_classes or postponed_classes:
+        final_text += "\n"
+        if edited_classes:
+            final_text += f"\n✏️ Обновлено в прежних сообщениях: {', '.join(edited_classes)}"
+        if diff_classes:
+            final_text += f"\n🔄 Отправлены только изменения: {', '.join(diff_classes)}"
+        if unchanged_classes:
+            final_text += f"\n💤 Без изменений: {', '.join(unchanged_classes)}"
+        if postponed_classes:
+            final_text += (
+                f"\n⏳ Telegram временно ограничил отправку, не обновлены: {', '.join(postponed_classes)}."
+                " Повторите /view_timetable через минуту"
+            )
+        final_text += "\nЧтобы получить все расписание заново, используйте /view_timetable full"
+    if not has_difficulty:
+        final_text += "\nЧтобы перемешать уроки заново, используйте /view_timetable new"
+
+    await update.message.reply_text(final_text)
+
 # Обновленная функция summary
 async def generate_timetable_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
     classes = context.user_data['classes']
     schedule = context.user_data['schedule']
+    has_difficulty = get_difficulty_settings(context) is not None
     
     total_classes = len(classes)
     total_subjects = sum(len(schedule[cls]) for cls in classes)
@@ -552,7 +1171,7 @@ async def generate_timetable_summary(update: Update, context: ContextTypes.DEFAU
     summary_text = f"✅ Расписание успешно создано!\n\n"
     
     # Проверяем использование сложности
-    if 'difficulty_settings' in context.user_data:
+    if has_difficulty:
         summary_text += "⚙️ Используются настройки сложности предметов\n\n"
     
     summary_text += f"📊 Статистика:\n"
@@ -585,7 +1204,7 @@ async def generate_timetable_summary(update: Update, context: ContextTypes.DEFAU
             summary_text += f"  • {subj['name']}: {subj['hours_per_week']} ч/нед{difficulty_info}\n"
         
         summary_text += f"  📊 Всего часов: {total_hours}\n"
-        if 'difficulty_settings' in context.user_data:
+        if has_difficulty:
             summary_text += f"  🔴 Сложных часов: {difficult_hours}\n"
             summary_text += f"  🟢 Легких часов: {easy_hours}\n"
     
@@ -593,7 +1212,7 @@ async def generate_timetable_summary(update: Update, context: ContextTypes.DEFAU
     summary_text += "/view_schedule - для просмотра предметов\n"
     summary_text += "/view_timetable - для просмотра расписания\n"
     
-    if 'difficulty_settings' not in context.user_data:
+    if not has_difficulty:
         summary_text += "\n⚠️ Для учета сложности предметов используйте /set_difficult"
     
     await update.message.reply_text(summary_text)
@@ -629,9 +1248,326 @@ async def clear_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         del context.user_data['schedule']
     if 'classes' in context.user_data:
         del context.user_data['classes']
+    if 'timetable' in context.user_data:
+        del context.user_data['timetable']
+    if 'timetable_messages' in context.user_data:
+        del context.user_data['timetable_messages']
     
     await update.message.reply_text("✅ Расписание очищено.")
 
+# Упаковка расписания в бинарный снимок
+def pack_snapshot(user_data):
+    """
+    Упаковывает расписание в компактный бинарный снимок:
+    таблица строк, упакованные массивы часов и сложности, сетка уроков
+    """
+    schedule = user_data.get('schedule', {})
+    classes = user_data.get('classes', list(schedule.keys()))
+    difficulty_settings = user_data.get('difficulty_settings', {})
+    timetable = user_data.get('timetable', {})
+
+    # Каждое название хранится в таблице строк один раз
+    strings = []
+    string_index = {}
+
+    def intern(value):
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    settings_part = bytearray()
+    for subject, level in difficulty_settings.items():
+        settings_part += struct.pack('<HB', intern(subject), level)
+
+    classes_part = bytearray()
+    for cls in classes:
+        subjects = schedule.get(cls, [])
+        count = len(subjects)
+        classes_part += struct.pack('<HH', intern(cls), count)
+        classes_part += struct.pack(f'<{count}H', *(intern(subj['name']) for subj in subjects))
+        classes_part += struct.pack(f'<{count}H', *(subj['hours_per_week'] for subj in subjects))
+        classes_part += struct.pack(f'<{count}B', *(subj.get('difficulty', 0) for subj in subjects))
+
+    grid_part = bytearray()
+    grid_classes = [cls for cls in classes if cls in timetable]
+    for cls in grid_classes:
+        grid_part += struct.pack('<H', intern(cls))
+        for day in DAYS_OF_WEEK:
+            lessons = timetable[cls].get(day, [])
+            grid_part += struct.pack('<B', len(lessons))
+            for lesson in lessons:
+                grid_part += struct.pack('<HBB', intern(lesson['name']), lesson['position'], lesson['difficulty'])
+
+    strings_part = bytearray()
+    for value in strings:
+        encoded = value.encode('utf-8')
+        strings_part += struct.pack('<H', len(encoded)) + encoded
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+        len(strings), len(difficulty_settings), len(classes), len(grid_classes)
+    )
+    return bytes(header + strings_part + settings_part + classes_part + grid_part)
+
+# Чтение бинарного снимка без копирования буфера
+def unpack_snapshot(buffer):
+    """
+    Читает снимок из bytes или bytearray через memoryview
+    """
+    try:
+        with memoryview(buffer) as view:
+            magic, version, n_strings, n_settings, n_classes, n_grids = SNAPSHOT_HEADER.unpack_from(view, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("not a schedule snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported snapshot version {version}")
+            offset = SNAPSHOT_HEADER.size
+
+            strings = []
+            for _ in range(n_strings):
+                (length,) = struct.unpack_from('<H', view, offset)
+                offset += 2
+                if offset + length > len(view):
+                    raise ValueError("truncated snapshot")
+                strings.append(str(view[offset:offset + length], 'utf-8'))
+                offset += length
+
+            difficulty_settings = {}
+            for _ in range(n_settings):
+                subject_id, level = struct.unpack_from('<HB', view, offset)
+                offset += 3
+                difficulty_settings[strings[subject_id]] = level
+
+            classes = []
+            schedule = {}
+            for _ in range(n_classes):
+                class_id, count = struct.unpack_from('<HH', view, offset)
+                offset += 4
+                names = struct.unpack_from(f'<{count}H', view, offset)
+                offset += 2 * count
+                hours = struct.unpack_from(f'<{count}H', view, offset)
+                offset += 2 * count
+                difficulties = struct.unpack_from(f'<{count}B', view, offset)
+                offset += count
+
+                cls = strings[class_id]
+                classes.append(cls)
+                schedule[cls] = [
+                    {'name': strings[name_id], 'hours_per_week': h, 'difficulty': d}
+                    for name_id, h, d in zip(names, hours, difficulties)
+                ]
+
+            timetable = {}
+            for _ in range(n_grids):
+                (class_id,) = struct.unpack_from('<H', view, offset)
+                offset += 2
+                daily_timetable = {}
+                for day in DAYS_OF_WEEK:
+                    (count,) = struct.unpack_from('<B', view, offset)
+                    offset += 1
+                    lessons = []
+                    for _ in range(count):
+                        name_id, position, difficulty = struct.unpack_from('<HBB', view, offset)
+                        offset += 4
+                        lessons.append({'name': strings[name_id], 'position': position, 'difficulty': difficulty})
+                    daily_timetable[day] = lessons
+                timetable[strings[class_id]] = daily_timetable
+
+            if offset != len(view):
+                raise ValueError("trailing data after snapshot")
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"corrupted snapshot: {e}") from e
+
+    return {
+        'classes': classes,
+        'schedule': schedule,
+        'difficulty_settings': difficulty_settings,
+        'timetable': timetable,
+    }
+
+# Запасной формат снимка — JSON
+def snapshot_to_json(user_data):
+    schedule = user_data.get('schedule', {})
+    return json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'classes': user_data.get('classes', list(schedule.keys())),
+        'schedule': schedule,
+        'difficulty_settings': user_data.get('difficulty_settings', {}),
+        'timetable': user_data.get('timetable', {}),
+    }, ensure_ascii=False)
+
+# Проверки значений из снимка
+def _is_count(value, limit):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= limit
+
+def _is_level(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value in DIFFICULTY_LEVELS.values()
+
+def validate_snapshot(snapshot):
+    """
+    Проверяет структуру загруженного снимка, при ошибке — ValueError
+    """
+    schedule = snapshot['schedule']
+    if not isinstance(schedule, dict):
+        raise ValueError("schedule must be a dict")
+    if len(schedule) > MAX_CLASSES:
+        raise ValueError(f"more than {MAX_CLASSES} classes")
+    for cls, subjects in schedule.items():
+        if not isinstance(cls, str) or not isinstance(subjects, list):
+            raise ValueError(f"bad schedule entry for {cls!r}")
+        if len(subjects) > MAX_SUBJECTS_PER_CLASS:
+            raise ValueError(f"more than {MAX_SUBJECTS_PER_CLASS} subjects in class {cls!r}")
+        for subj in subjects:
+            if (not isinstance(subj, dict)
+                    or not isinstance(subj.get('name'), str)
+                    or not _is_count(subj.get('hours_per_week'), MAX_WEEKLY_HOURS)
+                    or not _is_level(subj.get('difficulty'))):
+                raise ValueError(f"bad subject in class {cls!r}")
+        # Те же ограничения, что и при вводе предметов в диалоге
+        if sum(subj['hours_per_week'] for subj in subjects) > MAX_WEEKLY_HOURS:
+            raise ValueError(f"more than {MAX_WEEKLY_HOURS} hours in class {cls!r}")
+
+    classes = snapshot['classes']
+    if not isinstance(classes, list) or not all(isinstance(cls, str) for cls in classes):
+        raise ValueError("classes must be a list of strings")
+    if len(set(classes)) != len(classes) or any(cls not in schedule for cls in classes):
+        raise ValueError("classes must be unique and present in schedule")
+
+    difficulty_settings = snapshot['difficulty_settings']
+    if not isinstance(difficulty_settings, dict):
+        raise ValueError("difficulty_settings must be a dict")
+    for subject, level in difficulty_settings.items():
+        if not isinstance(subject, str) or not _is_level(level):
+            raise ValueError(f"bad difficulty setting for {subject!r}")
+
+    timetable = snapshot['timetable']
+    if not isinstance(timetable, dict):
+        raise ValueError("timetable must be a dict")
+    for cls, daily_timetable in timetable.items():
+        if cls not in schedule or not isinstance(daily_timetable, dict):
+            raise ValueError(f"bad timetable for {cls!r}")
+        for day, lessons in daily_timetable.items():
+            if day not in DAYS_OF_WEEK or not isinstance(lessons, list):
+                raise ValueError(f"bad timetable day {day!r} for {cls!r}")
+            if len(lessons) > MAX_LESSONS_PER_DAY:
+                raise ValueError(f"more than {MAX_LESSONS_PER_DAY} lessons on {day} for {cls!r}")
+            for lesson in lessons:
+                if (not isinstance(lesson, dict)
+                        or not isinstance(lesson.get('name'), str)
+                        or not _is_count(lesson.get('position'), MAX_LESSONS_PER_DAY)
+                        or lesson['position'] < 1
+                        or not _is_level(lesson.get('difficulty'))):
+                    raise ValueError(f"bad lesson in timetable for {cls!r}")
+            positions = [lesson['position'] for lesson in lessons]
+            if len(set(positions)) != len(positions):
+                raise ValueError(f"duplicate lesson positions on {day} for {cls!r}")
+        # Сетка всегда содержит все дни недели
+        for day in DAYS_OF_WEEK:
+            daily_timetable.setdefault(day, [])
+        # В сетке ровно те уроки, что заданы в расписании класса
+        if not grid_matches_subjects(daily_timetable, schedule[cls]):
+            raise ValueError(f"timetable does not match schedule for {cls!r}")
+
+    return snapshot
+
+def load_snapshot(data):
+    """
+    Определяет формат снимка (бинарный или JSON), загружает и проверяет его
+    """
+    if data[:len(SNAPSHOT_MAGIC)] == SNAPSHOT_MAGIC:
+        return validate_snapshot(unpack_snapshot(data))
+
+    try:
+        snapshot = json.loads(data)
+    except RecursionError as e:
+        raise ValueError("snapshot is nested too deeply") from e
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get('schedule'), dict):
+        raise ValueError("snapshot has no schedule")
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {snapshot.get('version')}")
+    return validate_snapshot({
+        'classes': snapshot.get('classes', list(snapshot['schedule'].keys())),
+        'schedule': snapshot['schedule'],
+        'difficulty_settings': snapshot.get('difficulty_settings', {}),
+        'timetable': snapshot.get('timetable', {}),
+    })
+
+# Экспорт снимка расписания
+async def export_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if 'schedule' not in context.user_data or not context.user_data['schedule']:
+        await update.message.reply_text("📭 У вас нет сохраненного расписания.\nИспользуйте /new_schedule для создания.")
+        return
+
+    use_json = bool(context.args) and context.args[0].lower() == 'json'
+
+    # В снимок попадают сами настройки, а не id профиля из реестра
+    snapshot_source = dict(context.user_data)
+    snapshot_source['difficulty_settings'] = get_difficulty_settings(context) or {}
+
+    if not use_json:
+        try:
+            data = pack_snapshot(snapshot_source)
+            filename = 'schedule.osbs'
+        except struct.error as e:
+            # Значения не помещаются в бинарный формат — выгружаем JSON
+            logger.warning(f'Binary snapshot failed, falling back to JSON: {e}')
+            use_json = True
+
+    if use_json:
+        data = snapshot_to_json(snapshot_source).encode('utf-8')
+        filename = 'schedule.json'
+
+    await update.message.reply_document(
+        document=io.BytesIO(data),
+        filename=filename,
+        caption=f"💾 Снимок расписания ({len(data)} байт)\nДля загрузки используйте /import"
+    )
+
+# Начало импорта снимка
+async def import_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "📥 Загрузка снимка расписания\n\n"
+        "Отправьте файл снимка, полученный командой /export,\n"
+        "или вставьте снимок в формате JSON текстом.\n\n"
+        "Текущее расписание будет заменено.\n"
+        "Для отмены введите /cancel"
+    )
+    return INPUT_SNAPSHOT
+
+# Обработка присланного снимка
+async def input_snapshot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    if update.message.document:
+        snapshot_file = await update.message.document.get_file()
+        data = await snapshot_file.download_as_bytearray()
+    else:
+        data = update.message.text.strip().encode('utf-8')
+
+    try:
+        snapshot = load_snapshot(data)
+        profile_id = None
+        if snapshot['difficulty_settings']:
+            profile_id = register_profile(snapshot['difficulty_settings'])
+    except ValueError as e:
+        logger.warning(f'Snapshot import failed: {e}')
+        await update.message.reply_text("❌ Не удалось прочитать снимок. Проверьте файл и попробуйте снова.")
+        return INPUT_SNAPSHOT
+
+    context.user_data['schedule'] = snapshot['schedule']
+    context.user_data['classes'] = snapshot['classes']
+    context.user_data['timetable'] = snapshot['timetable']
+    # Загруженное расписание еще не отправлялось в этот чат
+    context.user_data.pop('timetable_messages', None)
+    set_profile(context.user_data, profile_id)
+
+    await update.message.reply_text(
+        f"✅ Снимок загружен!\n"
+        f"• Классов: {len(snapshot['classes'])}\n"
+        f"• Настроек сложности: {len(snapshot['difficulty_settings'])}\n\n"
+        f"Используйте /view_timetable для просмотра расписания"
+    )
+    return ConversationHandler.END
+
 # ConversationHandler для создания расписания
 conv_handler_new = ConversationHandler(
     entry_points=[CommandHandler('new_schedule', new_schedule)],
@@ -651,6 +1587,15 @@ conv_handler_difficult = ConversationHandler(
     fallbacks=[CommandHandler('cancel', cancel)],
     )
 
+# ConversationHandler для загрузки снимка
+conv_handler_import = ConversationHandler(
+    entry_points=[CommandHandler('import', import_schedule)],
+    states={
+        INPUT_SNAPSHOT: [MessageHandler(filters.Document.ALL | (filters.TEXT & ~filters.COMMAND), input_snapshot)],
+    },
+    fallbacks=[CommandHandler('cancel', cancel)],
+)
+
 # Обработчик текстовых сообщений (не команд)
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_text = update.message.text
@@ -670,9 +1615,18 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /new_schedule — создать новое расписание
 /set_difficult — задать список сложных предметов
 /show_difficult — показать текущие настройки сложности
+/profiles — список профилей сложности
+/use_profile — выбрать профиль сложности (например, /use_profile стандартный)
+/chat_profile — выбрать профиль сложности для всего чата (школы)
+/save_profile — сохранить текущие настройки сложности под названием
+/remove_profile — удалить сохраненный профиль из чата
 /view_schedule — посмотреть список предметов по классам
-/view_timetable — посмотреть расписание по дням недели
+/view_timetable — посмотреть расписание по дням недели (присылает только изменения)
+/view_timetable full — прислать расписание всех классов заново
+/view_timetable new — заново перемешать уроки (без настроек сложности)
 /clear_schedule — очистить расписание
+/export — выгрузить снимок расписания (/export json — в формате JSON)
+/import — загрузить снимок расписания
 
 ⚙️ Сложность предметов:
 • Сложные предметы (математика, физика) ставятся в начало дня
@@ -687,12 +1641,19 @@ def main() -> None:
     # Регистрация обработчиков
     application.add_handler(conv_handler_new)
     application.add_handler(conv_handler_difficult)
+    application.add_handler(conv_handler_import)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("show_difficult", show_difficult))
+    application.add_handler(CommandHandler("profiles", list_profiles))
+    application.add_handler(CommandHandler("use_profile", use_profile))
+    application.add_handler(CommandHandler("chat_profile", chat_profile))
+    application.add_handler(CommandHandler("save_profile", save_profile))
+    application.add_handler(CommandHandler("remove_profile", remove_profile))
     application.add_handler(CommandHandler("view_schedule", view_schedule))
     application.add_handler(CommandHandler("view_timetable", view_timetable))
     application.add_handler(CommandHandler("clear_schedule", clear_schedule))
+    application.add_handler(CommandHandler("export", export_schedule))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_error_handler(error)
 